@@ -0,0 +1,299 @@
+import re
+import sqlite3
+import sys
+import time
+import zlib
+
+import numpy as np
+
+# 64개 해시 = 16 band x 4 row → 후보 임계값 약 (1/16)^(1/4) ≈ 0.5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+# 긴 카드도 임시 메모리가 NUM_PERM x CHUNK 크기를 넘지 않게 shingle을 나눠서 계산
+CHUNK = 16384
+# 이보다 짧은 내용은 중복 판정에서 제외 (빈 카드끼리 묶이는 것 방지)
+MIN_LENGTH = 20
+# 남길 카드와의 추정 유사도가 이 값 이상이어야 중복으로 보고 지운다
+THRESHOLD = 0.8
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_SPACE_RE = re.compile(r"\s+")
+
+
+def init_tables(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS card_minhash(
+            card_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS card_lsh(
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            card_id INTEGER NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_card_lsh_bucket ON card_lsh(band, bucket)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_card_lsh_card ON card_lsh(card_id)")
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS dedup_meta(key TEXT PRIMARY KEY, value REAL)"
+    )
+    # 카드가 없는 새 DB는 빈 인덱스가 곧 완성된 인덱스 (이후 쓰기는 index_card로 반영)
+    if cur.execute("SELECT 1 FROM cards LIMIT 1").fetchone() is None:
+        _mark_built(cur)
+
+
+def _mark_built(cur):
+    cur.execute(
+        "INSERT OR REPLACE INTO dedup_meta(key, value) VALUES ('built_at', ?)",
+        (time.time(),),
+    )
+
+
+def is_built(conn):
+    """기존 카드 전체가 인덱싱된 적이 있는지 (업그레이드한 DB는 rebuild 전까지 False)."""
+    row = conn.execute("SELECT 1 FROM dedup_meta WHERE key='built_at'").fetchone()
+    return row is not None
+
+
+def signature(content: str):
+    """문자 5-gram shingle의 MinHash 서명 (uint32 NUM_PERM개). 너무 짧으면 None."""
+    text = _SPACE_RE.sub(" ", (content or "").lower()).strip()
+    if len(text) < MIN_LENGTH:
+        return None
+    # 코드포인트 배열 위에서 5-gram 다항식 해시를 한 번에 계산 (uint64 overflow 허용)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    n = len(codes) - SHINGLE + 1
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(SHINGLE):
+        h = h * np.uint64(1000003) + codes[j : j + n]
+    shingles = np.unique((h ^ (h >> np.uint64(32))) % np.uint64(_PRIME))
+    sig = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), CHUNK):
+        chunk = shingles[start : start + CHUNK]
+        np.minimum(sig, ((_A * chunk + _B) % _PRIME).min(axis=1), out=sig)
+    return sig.astype(np.uint32)
+
+
+def _buckets(sig):
+    return [
+        zlib.crc32(sig[i * ROWS : (i + 1) * ROWS].tobytes()) for i in range(BANDS)
+    ]
+
+
+def _write_rows(cur, rows, replace=True):
+    """rows: [(card_id, sig)] — 기존 항목을 지우고 새 서명/버킷을 넣는다."""
+    if replace:
+        ids = [(card_id,) for card_id, _ in rows]
+        cur.executemany("DELETE FROM card_minhash WHERE card_id=?", ids)
+        cur.executemany("DELETE FROM card_lsh WHERE card_id=?", ids)
+    rows = [(card_id, sig) for card_id, sig in rows if sig is not None]
+    cur.executemany(
+        "INSERT INTO card_minhash(card_id, signature) VALUES (?, ?)",
+        [(card_id, sig.tobytes()) for card_id, sig in rows],
+    )
+    cur.executemany(
+        "INSERT INTO card_lsh(band, bucket, card_id) VALUES (?, ?, ?)",
+        [
+            (band, bucket, card_id)
+            for card_id, sig in rows
+            for band, bucket in enumerate(_buckets(sig))
+        ],
+    )
+
+
+def index_card(conn, card_id: int, content: str):
+    """카드 쓰기와 같은 트랜잭션 안에서 호출 (commit은 호출한 쪽에서)."""
+    _write_rows(conn.cursor(), [(card_id, signature(content))])
+
+
+def remove_cards(conn, card_ids):
+    cur = conn.cursor()
+    ids = [(card_id,) for card_id in card_ids]
+    cur.executemany("DELETE FROM card_minhash WHERE card_id=?", ids)
+    cur.executemany("DELETE FROM card_lsh WHERE card_id=?", ids)
+
+
+def rebuild(conn, batch_size: int = 2000, progress=None):
+    """cards 전체를 id 순서로 한 번 훑으며 인덱스를 다시 만든다.
+
+    batch_size 단위로 읽고 커밋하므로 카드 수와 무관하게 메모리가 일정하다.
+    progress(done, total)가 주어지면 배치마다 호출한다.
+    """
+    cur = conn.cursor()
+    total = cur.execute("SELECT count(*) FROM cards").fetchone()[0]
+    cur.execute("DELETE FROM card_minhash")
+    cur.execute("DELETE FROM card_lsh")
+    conn.commit()
+    last_id, done = 0, 0
+    while True:
+        rows = cur.execute(
+            "SELECT id, content FROM cards WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        _write_rows(
+            cur,
+            [(card_id, signature(content)) for card_id, content in rows],
+            replace=False,
+        )
+        conn.commit()
+        last_id = rows[-1][0]
+        done += len(rows)
+        if progress:
+            progress(done, total)
+    _mark_built(cur)
+    conn.commit()
+    return done
+
+
+def _load_signatures(cur, card_ids):
+    marks = ",".join("?" * len(card_ids))
+    cur.execute(
+        f"SELECT card_id, signature FROM card_minhash WHERE card_id IN ({marks})",
+        list(card_ids),
+    )
+    return {
+        card_id: np.frombuffer(blob, dtype=np.uint32)
+        for card_id, blob in cur.fetchall()
+    }
+
+
+def find_clusters(conn, threshold: float = THRESHOLD):
+    """중복 묶음 [(남길 card_id, [(card_id, 남길 카드와의 유사도), ...]), ...].
+
+    같은 LSH 버킷에 들어간 카드끼리만 서명을 비교하므로 O(n²)이 아니다.
+    버킷 안에서는 첫 카드(pivot)와만 비교하고 union-find로 후보를 모은 뒤,
+    조금씩 고친 카드가 사슬처럼 이어져 묶이지 않도록 남길 카드와 직접
+    비교해 threshold 이상인 카드만 묶음에 넣는다. 큰 묶음이 먼저 온다.
+    """
+    parent = {}
+    linked = set()
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    cur = conn.cursor()
+    buckets = cur.execute(
+        "SELECT group_concat(card_id) FROM card_lsh "
+        "GROUP BY band, bucket HAVING count(*) > 1"
+    ).fetchall()
+    checked = set()
+    for (members,) in buckets:
+        ids = sorted({int(x) for x in members.split(",")})
+        pivot = ids[0]
+        todo = [x for x in ids[1:] if (pivot, x) not in checked]
+        if not todo:
+            continue
+        sigs = _load_signatures(cur, [pivot] + todo)
+        if pivot not in sigs:
+            continue
+        for other in todo:
+            checked.add((pivot, other))
+            if other not in sigs:
+                continue
+            score = float(np.mean(sigs[pivot] == sigs[other]))
+            if score >= threshold:
+                parent[find(other)] = find(pivot)
+                linked.update((pivot, other))
+
+    groups = {}
+    for card_id in linked:
+        groups.setdefault(find(card_id), []).append(card_id)
+    clusters = []
+    for ids in groups.values():
+        # 남길 카드와 닮은 카드를 떼어 내고, 남은 카드들로 다시 반복
+        while len(ids) > 1:
+            keep_id, scores = _score_against_keeper(cur, ids)
+            near = [(card_id, s) for card_id, s in scores if s >= threshold]
+            if near:
+                clusters.append((keep_id, sorted([(keep_id, 1.0)] + near)))
+            done = {keep_id} | {card_id for card_id, _ in near}
+            ids = [card_id for card_id in ids if card_id not in done]
+    clusters.sort(key=lambda c: (-len(c[1]), c[0]))
+    return clusters
+
+
+def _score_against_keeper(cur, card_ids):
+    """(남길 카드: 내용이 가장 긴 것, 같으면 id가 작은 것, [(나머지 id, 유사도)])."""
+    marks = ",".join("?" * len(card_ids))
+    rows = cur.execute(
+        f"SELECT id, length(content) FROM cards WHERE id IN ({marks})",
+        list(card_ids),
+    ).fetchall()
+    if not rows:
+        return None, []
+    keep_id = min(rows, key=lambda r: (-(r[1] or 0), r[0]))[0]
+    sigs = _load_signatures(cur, [r[0] for r in rows])
+    keep_sig = sigs.get(keep_id)
+    scores = [
+        (
+            r[0],
+            float(np.mean(keep_sig == sigs[r[0]]))
+            if keep_sig is not None and r[0] in sigs
+            else 0.0,
+        )
+        for r in rows
+        if r[0] != keep_id
+    ]
+    return keep_id, scores
+
+
+def pick_keeper(conn, card_ids, threshold: float = THRESHOLD):
+    """묶음에서 남길 카드와 지울 카드들.
+
+    지울 카드는 남길 카드와 직접 비교해 threshold 이상인 것만 고른다.
+    (다른 카드를 거쳐서만 닮은 카드는 남긴다)
+    """
+    keep_id, scores = _score_against_keeper(conn.cursor(), list(card_ids))
+    return keep_id, [card_id for card_id, score in scores if score >= threshold]
+
+
+def merge_cluster(conn, card_ids, cleanup=None):
+    """묶음에서 pick_keeper()가 고른 지울 카드들을 한 트랜잭션으로 삭제.
+
+    cleanup(conn, 삭제할 id 목록)이 주어지면 같은 트랜잭션 안에서 호출한다.
+    (남긴 card_id, 삭제한 card_id 목록)을 돌려준다.
+    """
+    keep_id, drop_ids = pick_keeper(conn, card_ids)
+    if not drop_ids:
+        return keep_id, drop_ids
+    with conn:
+        conn.executemany("DELETE FROM cards WHERE id=?", [(x,) for x in drop_ids])
+        remove_cards(conn, drop_ids)
+        if cleanup:
+            cleanup(conn, drop_ids)
+    return keep_id, drop_ids
+
+
+if __name__ == "__main__":
+    # 대용량 DB 전체 스캔: python dedup.py memo.db
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "memo.db")
+    init_tables(conn)
+    started = time.time()
+    n = rebuild(
+        conn,
+        progress=lambda done, total: print(f"\r{done}/{total}", end="", flush=True),
+    )
+    print(f"\n{n}개 카드 인덱싱 완료 ({time.time() - started:.1f}s)")
+    clusters = find_clusters(conn)
+    print(f"중복 묶음 {len(clusters)}개")
@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+import time
+
+
+class DraftJournal:
+    """저장 전 편집 내용을 남겨두는 append-only 초안 일지.
+
+    카드 DB와 다른 파일(WAL, synchronous=NORMAL)에 한 줄씩 추가만 하므로
+    입력할 때마다 update_card를 부르는 것보다 훨씬 싸고, 본 DB의 쓰기 잠금과도
+    부딪히지 않는다. 같은 (user, card, field)는 마지막 줄만 의미가 있다.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS drafts(
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                user TEXT NOT NULL,
+                card_id INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                ts REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_drafts_user ON drafts(user, card_id)"
+        )
+        self._conn.commit()
+        self.compact_superseded()
+
+    def append(self, user: str, card_id: int, field: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO drafts(user, card_id, field, value, ts) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user, card_id, field, value, time.time()),
+            )
+            self._conn.commit()
+
+    def pending(self, user: str):
+        """{card_id: {field: 마지막 값}} — 아직 저장되지 않은 초안."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT card_id, field, value FROM drafts
+                WHERE seq IN (
+                    SELECT max(seq) FROM drafts WHERE user=?
+                    GROUP BY card_id, field
+                )
+                """,
+                (user,),
+            ).fetchall()
+        result = {}
+        for card_id, field, value in rows:
+            result.setdefault(card_id, {})[field] = value
+        return result
+
+    def discard(self, user: str, card_ids):
+        """카드가 저장/삭제되면 해당 초안을 지운다."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM drafts WHERE user=? AND card_id=?",
+                [(user, card_id) for card_id in card_ids],
+            )
+            self._conn.commit()
+
+    def compact_superseded(self):
+        """같은 칸의 이전 초안 줄을 지우고 (마지막 값만 유지) WAL을 비운다."""
+        with self._lock:
+            self._conn.execute(
+                """
+                DELETE FROM drafts WHERE seq NOT IN (
+                    SELECT max(seq) FROM drafts GROUP BY user, card_id, field
+                )
+                """
+            )
+            self._conn.commit()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
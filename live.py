@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+
+# page_versions에서 페이지 목록(추가/삭제/이름 변경)의 버전을 담는 자리
+PAGE_LIST = 0
+# 실시간 새로고침 주기 (초)
+POLL_SECONDS = 2
+
+_BUMP = (
+    "INSERT INTO page_versions(page_id, version) SELECT {page_id}, 1 WHERE {cond} "
+    "ON CONFLICT(page_id) DO UPDATE SET version = version + 1;"
+)
+
+
+def _bump(page_id, cond="1"):
+    return _BUMP.format(page_id=page_id, cond=cond)
+
+
+def init_tables(conn):
+    """카드/페이지가 바뀔 때마다 해당 페이지의 버전을 올리는 트리거.
+
+    트리거라서 앱이 직접 쓰든 store_service를 거치든 똑같이 기록된다.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS page_versions(
+            page_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """
+    )
+    triggers = {
+        "pv_card_insert": ("AFTER INSERT ON cards", _bump("NEW.page_id")),
+        "pv_card_update": (
+            "AFTER UPDATE ON cards",
+            _bump("NEW.page_id")
+            + _bump("OLD.page_id", "OLD.page_id IS NOT NEW.page_id"),
+        ),
+        "pv_card_delete": ("AFTER DELETE ON cards", _bump("OLD.page_id")),
+        "pv_page_insert": ("AFTER INSERT ON pages", _bump(PAGE_LIST)),
+        "pv_page_update": ("AFTER UPDATE ON pages", _bump(PAGE_LIST)),
+        "pv_page_delete": (
+            "AFTER DELETE ON pages",
+            _bump(PAGE_LIST) + "DELETE FROM page_versions WHERE page_id = OLD.id;",
+        ),
+    }
+    for name, (event, body) in triggers.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+
+class ChangeWatcher:
+    """DB 하나를 지켜보는 전용 연결 (세션끼리 공유).
+
+    PRAGMA data_version은 다른 연결이 커밋했을 때만 바뀌므로, 그대로면
+    page_versions를 읽지 않고 지난번 결과를 돌려준다. 이 연결은 쓰지 않으니
+    앱 자신의 커밋도 '다른 연결'의 커밋으로 잡힌다.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(
+            path, timeout=10, check_same_thread=False, isolation_level=None
+        )
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._versions = {}
+
+    def versions(self):
+        """{page_id: 버전}. PAGE_LIST 키는 페이지 목록의 버전."""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._versions = dict(
+                    self._conn.execute(
+                        "SELECT page_id, version FROM page_versions"
+                    ).fetchall()
+                )
+                self._data_version = data_version
+            return self._versions
@@ -1,7 +1,19 @@
 import streamlit as st
+import os
 import sqlite3
+import time
 from streamlit_option_menu import option_menu
 
+import dedup
+import live
+import maintenance
+import revisions
+import storage
+from drafts import DraftJournal
+from preview import PreviewCache
+from related import RelatedIndex
+from store_service import StoreClient, StoreError
+
 st.set_page_config(page_title="MemoKing", layout="wide")
 
 # ============================================================
@@ -37,6 +49,7 @@ def login_view():
     if st.button("로그인"):
         if user_id == VALID_ID and user_pw == VALID_PW:
             st.session_state["logged_in"] = True
+            st.session_state["user_id"] = user_id
             st.success("로그인 성공!")
             st.rerun()
         else:
@@ -51,8 +64,11 @@ if not st.session_state["logged_in"]:
 # ============================================================
 # DB 초기화 (SQLite)
 # ============================================================
-def init_db():
-    conn = sqlite3.connect("memo.db")
+storage_conf = storage.load_config(st.secrets)
+
+
+def init_db(path: str):
+    conn = storage.connect(path)
     cur = conn.cursor()
 
     cur.execute(
@@ -76,22 +92,141 @@ def init_db():
         """
     )
 
+    dedup.init_tables(conn)
+    revisions.init_tables(conn)
+    live.init_tables(conn)
+
     conn.commit()
     return conn
 
 
-db = init_db()
+@st.cache_resource(max_entries=storage_conf["max_connections"])
+def prepare_db(path: str):
+    """경로마다 한 번만 테이블을 만든다."""
+    init_db(path).close()
+
+
+def switch_notebook():
+    for key in (
+        "current_page_id",
+        "draft_values",
+        "dedup_report",
+        "pages_cache",
+        "cards_cache",
+    ):
+        st.session_state.pop(key, None)
+
+
+notebooks = list(storage_conf["notebooks"])
+if len(notebooks) > 1:
+    with st.sidebar:
+        notebook = st.selectbox(
+            "노트북", notebooks, key="notebook", on_change=switch_notebook
+        )
+else:
+    notebook = notebooks[0]
+
+# 샤딩 모드(storage.shard_dir)면 로그인 사용자마다 별도 DB 파일을 쓴다
+USER_ID = st.session_state.get("user_id", VALID_ID)
+DB_PATH = storage.resolve_path(storage_conf, notebook, USER_ID)
+prepare_db(DB_PATH)
+# 트랜잭션은 연결 단위라서 세션끼리 섞이지 않게 스크립트 실행마다 따로 연다
+db = storage.connect(DB_PATH)
+
+
+@st.cache_resource
+def load_store_client(socket_path: str):
+    return StoreClient(socket_path)
+
+
+# 저장소 서비스(store_service.py)가 이 DB를 맡고 있으면 쓰기/목록 읽기를 맡긴다
+store = None
+if storage_conf["socket"]:
+    try:
+        store = load_store_client(storage_conf["socket"])
+        if store.call("info")["db_path"] != os.path.abspath(DB_PATH):
+            store = None
+    except (OSError, ValueError, StoreError):
+        store = None
+        st.sidebar.caption("저장소 서비스에 연결할 수 없어 DB에 직접 저장합니다.")
+
+
+def call_store(op, *args):
+    """쓰기 요청. 실패하면 traceback 대신 오류를 보여 주고 이번 실행을 멈춘다.
+
+    (실패한 쓰기를 DB에 직접 다시 하면 두 번 반영될 수 있어 되돌아가지 않는다)
+    """
+    try:
+        return store.call(op, *args)
+    except (OSError, ValueError, StoreError) as exc:
+        st.error(f"저장소 서비스 요청이 실패했습니다 ({op}): {exc}")
+        st.stop()
+
+
+@st.cache_resource(max_entries=storage_conf["max_connections"])
+def load_related_index(db_path: str):
+    index = RelatedIndex(db_path + ".related.npz")
+    index.load()
+    conn = sqlite3.connect(db_path)
+    index.sync(conn)
+    conn.close()
+    return index
+
+
+related_index = load_related_index(DB_PATH)
+
+
+@st.cache_resource
+def load_maintenance_scheduler():
+    scheduler = maintenance.MaintenanceScheduler()
+    scheduler.start()
+    return scheduler
+
+
+maintenance_scheduler = load_maintenance_scheduler()
+maintenance_scheduler.touch(DB_PATH)
+
+
+@st.cache_resource
+def load_preview_cache():
+    return PreviewCache(max_entries=2000, max_bytes=32 * 1024 * 1024)
+
+
+preview_cache = load_preview_cache()
+
+
+@st.cache_resource(max_entries=storage_conf["max_connections"])
+def load_draft_journal(db_path: str):
+    return DraftJournal(db_path + ".drafts")
+
+
+draft_journal = load_draft_journal(DB_PATH)
+
+
+@st.cache_resource(max_entries=storage_conf["max_connections"])
+def load_change_watcher(db_path: str):
+    return live.ChangeWatcher(db_path)
+
+
+change_watcher = load_change_watcher(DB_PATH)
 
 # ============================================================
 # PAGE / CARD 함수
 # ============================================================
 def get_pages():
+    if store is not None:
+        try:
+            return store.call("get_pages")
+        except (OSError, ValueError, StoreError):
+            pass  # 읽기는 DB에서 직접 해도 결과가 같다
     cur = db.cursor()
     cur.execute("SELECT id, title FROM pages ORDER BY id ASC")
     return cur.fetchall()
 
 
 def add_page(title="새 페이지"):
+    if store is not None:
+        return call_store("add_page", title)
     cur = db.cursor()
     cur.execute("INSERT INTO pages(title) VALUES(?)", (title,))
     db.commit()
@@ -99,19 +234,37 @@ def add_page(title="새 페이지"):
 
 
 def delete_page(page_id: int):
-    cur = db.cursor()
-    cur.execute("DELETE FROM cards WHERE page_id=?", (page_id,))
-    cur.execute("DELETE FROM pages WHERE id=?", (page_id,))
-    db.commit()
+    if store is not None:
+        card_ids = call_store("delete_page", page_id)
+    else:
+        cur = db.cursor()
+        cur.execute("SELECT id FROM cards WHERE page_id=?", (page_id,))
+        card_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("DELETE FROM cards WHERE page_id=?", (page_id,))
+        cur.execute("DELETE FROM pages WHERE id=?", (page_id,))
+        dedup.remove_cards(db, card_ids)
+        revisions.remove_cards(db, card_ids)
+        db.commit()
+    for card_id in card_ids:
+        related_index.remove(card_id)
+    draft_journal.discard(USER_ID, card_ids)
 
 
 def rename_page(page_id: int, new_title: str):
+    if store is not None:
+        call_store("rename_page", page_id, new_title)
+        return
     cur = db.cursor()
     cur.execute("UPDATE pages SET title=? WHERE id=?", (new_title, page_id))
     db.commit()
 
 
 def get_cards(page_id: int):
+    if store is not None:
+        try:
+            return store.call("get_cards", page_id)
+        except (OSError, ValueError, StoreError):
+            pass  # 읽기는 DB에서 직접 해도 결과가 같다
     cur = db.cursor()
     cur.execute(
         "SELECT id, title, content FROM cards WHERE page_id=? ORDER BY id ASC",
@@ -121,37 +274,144 @@ def get_cards(page_id: int):
 
 
 def add_card(page_id: int):
-    cur = db.cursor()
-    cur.execute(
-        "INSERT INTO cards(page_id, title, content) VALUES (?, ?, ?)",
-        (page_id, "제목 없음", ""),
-    )
-    db.commit()
+    if store is not None:
+        card_id = call_store("add_card", page_id)
+    else:
+        cur = db.cursor()
+        cur.execute(
+            "INSERT INTO cards(page_id, title, content) VALUES (?, ?, ?)",
+            (page_id, "제목 없음", ""),
+        )
+        db.commit()
+        card_id = cur.lastrowid
+    related_index.upsert(card_id, "제목 없음", "", page_id=page_id)
 
 
 def update_card(card_id: int, title: str, content: str):
-    cur = db.cursor()
-    cur.execute(
-        "UPDATE cards SET title=?, content=? WHERE id=?",
-        (title, content, card_id),
-    )
-    db.commit()
+    if store is not None:
+        if not call_store("update_card", card_id, title, content):
+            return
+    else:
+        cur = db.cursor()
+        cur.execute("SELECT title, content FROM cards WHERE id=?", (card_id,))
+        row = cur.fetchone()
+        if row is None or row == (title, content):
+            return
+        revisions.record(db, card_id, row[0], row[1], title, content)
+        cur.execute(
+            "UPDATE cards SET title=?, content=? WHERE id=?",
+            (title, content, card_id),
+        )
+        dedup.index_card(db, card_id, content)
+        db.commit()
+    related_index.upsert(card_id, title, content)
 
 
 def delete_card_by_title(page_id: int, title: str):
     """같은 제목이 여러 개면 첫 번째 카드만 삭제."""
+    if store is not None:
+        card_id = call_store("delete_card_by_title", page_id, title)
+    else:
+        cur = db.cursor()
+        cur.execute(
+            "SELECT id FROM cards WHERE page_id=? AND title=? ORDER BY id ASC",
+            (page_id, title),
+        )
+        row = cur.fetchone()
+        card_id = row[0] if row else None
+        if card_id is not None:
+            cur.execute("DELETE FROM cards WHERE id=?", (card_id,))
+            dedup.remove_cards(db, [card_id])
+            revisions.remove_cards(db, [card_id])
+            db.commit()
+    if card_id is None:
+        return False
+    related_index.remove(card_id)
+    draft_journal.discard(USER_ID, [card_id])
+    return True
+
+
+def restore_revision(card_id: int, rev: int):
+    """예전 리비전을 현재 내용으로 저장 (복원도 새 리비전으로 남는다).
+
+    그 사이 정리(compact)돼 리비전이 없으면 False.
+    """
+    version = revisions.reconstruct(db, card_id, rev)
+    if version is None:
+        return False
+    update_card(card_id, *version)
+    draft_journal.discard(USER_ID, [card_id])
+    st.session_state.get("draft_values", {}).pop(card_id, None)
+    for key in (f"title_{card_id}", f"content_{card_id}"):
+        st.session_state.pop(key, None)
+    return True
+
+
+def journal_edit(card_id: int, field: str):
+    """제목/내용 위젯 on_change: 저장 전 내용을 초안 일지에 남긴다."""
+    value = st.session_state.get(f"{field}_{card_id}", "")
+    draft_journal.append(USER_ID, card_id, field, value)
+    # 읽기 모드로 편집기가 잠시 사라져도 저장 전 내용이 남아 있도록
+    pending = st.session_state.setdefault("draft_values", {})
+    pending.setdefault(card_id, {})[field] = value
+
+
+def merge_duplicate_cards(card_ids):
+    """중복 묶음에서 한 장만 남기고 나머지 삭제 (한 트랜잭션)."""
+    if store is not None:
+        keep_id, drop_ids = call_store("merge_cluster", list(card_ids))
+    else:
+        keep_id, drop_ids = dedup.merge_cluster(
+            db, card_ids, cleanup=revisions.remove_cards
+        )
+    for card_id in drop_ids:
+        related_index.remove(card_id)
+        st.session_state.get("draft_values", {}).pop(card_id, None)
+    draft_journal.discard(USER_ID, drop_ids)
+    return keep_id, drop_ids
+
+
+def get_card_titles(card_ids):
+    """{card_id: (카드 제목, 페이지 제목)}"""
+    if not card_ids:
+        return {}
+    marks = ",".join("?" * len(card_ids))
     cur = db.cursor()
     cur.execute(
-        "SELECT id FROM cards WHERE page_id=? AND title=? ORDER BY id ASC",
-        (page_id, title),
+        "SELECT c.id, c.title, p.title FROM cards c "
+        f"JOIN pages p ON p.id = c.page_id WHERE c.id IN ({marks})",
+        list(card_ids),
     )
-    row = cur.fetchone()
-    if row:
-        card_id = row[0]
-        cur.execute("DELETE FROM cards WHERE id=?", (card_id,))
-        db.commit()
-        return True
-    return False
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+
+def load_pages(versions):
+    """페이지 목록 버전이 그대로면 세션에 저장해 둔 목록을 다시 쓴다."""
+    version = versions.get(live.PAGE_LIST, 0)
+    cached = st.session_state.get("pages_cache")
+    if cached is None or cached[0] != version:
+        cached = (version, get_pages())
+        st.session_state["pages_cache"] = cached
+    return cached[1]
+
+
+def load_cards(versions, page_id: int):
+    """그 페이지의 버전이 바뀐 경우에만 카드를 다시 읽는다."""
+    version = versions.get(page_id, 0)
+    cache = st.session_state.setdefault("cards_cache", {})
+    cached = cache.get(page_id)
+    if cached is None or cached[0] != version:
+        cached = (version, get_cards(page_id))
+        cache[page_id] = cached
+    return cached[1]
+
+
+@st.fragment(run_every=live.POLL_SECONDS)
+def watch_changes(seen):
+    """다른 세션이 지금 보는 페이지나 페이지 목록을 바꿨을 때만 전체를 다시 그린다."""
+    versions = change_watcher.versions()
+    if any(versions.get(key, 0) != version for key, version in seen.items()):
+        st.rerun()
 
 
 # ============================================================
@@ -252,9 +512,13 @@ with st.sidebar:
     st.markdown("### memo king")
     if st.button("로그아웃"):
         st.session_state["logged_in"] = False
+        switch_notebook()
         st.rerun()
 
-    pages = get_pages()
+    page_versions = change_watcher.versions()
+    # 다른 프로세스가 바꾼 카드도 관련 카드에 반영 (바뀐 페이지만 다시 읽음)
+    related_index.sync_versions(db, page_versions)
+    pages = load_pages(page_versions)
     if not pages:
         add_page("아이디어")
         pages = get_pages()
@@ -367,6 +631,52 @@ with st.sidebar:
                 st.session_state["reset_page_toolbar"] = True
                 st.rerun()
 
+    if st.toggle("실시간 새로고침", value=True, key="live_refresh"):
+        watch_changes(
+            {
+                live.PAGE_LIST: page_versions.get(live.PAGE_LIST, 0),
+                current_page_id: page_versions.get(current_page_id, 0),
+            }
+        )
+
+    preview_stats = preview_cache.stats()
+    st.caption(
+        f"미리보기 캐시 {preview_stats['entries']}개 · "
+        f"적중률 {preview_stats['hit_rate']:.0%}"
+    )
+
+    with st.expander("🛠 DB 관리", expanded=False):
+        status = maintenance_scheduler.status(DB_PATH)
+        st.caption(f"상태: {status['state']}")
+        for task, label in (
+            ("optimize", "통계 갱신"),
+            ("incremental_vacuum", "빈 공간 회수"),
+            ("wal_checkpoint", "WAL 체크포인트"),
+            ("quick_check", "무결성 검사"),
+        ):
+            last = status["last_run"].get(task)
+            when = time.strftime("%m-%d %H:%M", time.localtime(last)) if last else "-"
+            st.caption(f"{label}: {when}")
+        st.caption(
+            f"회수한 공간 {status['reclaimed_bytes'] / 1024:.0f} KB · "
+            f"남은 빈 공간 {status['freelist_bytes'] / 1024:.0f} KB"
+        )
+        st.caption(f"검사 결과: {status['quick_check'] or '-'}")
+        if status["last_error"]:
+            st.warning(status["last_error"])
+        if st.button("지금 실행", key="maintenance_run"):
+            maintenance_scheduler.request_run(DB_PATH)
+            st.rerun()
+        if db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            st.caption("이 DB는 삭제한 공간을 자동으로 돌려주지 않습니다.")
+            if st.button("증분 VACUUM 켜기 (전체 VACUUM 1회)", key="maintenance_vacuum"):
+                try:
+                    maintenance.enable_incremental_vacuum(DB_PATH)
+                except sqlite3.OperationalError as exc:
+                    st.warning(f"VACUUM 실패: {exc}")
+                else:
+                    st.rerun()
+
 # ============================================================
 # 본문 상단 : 페이지 제목 + 카드 툴바(radio)
 # ============================================================
@@ -374,7 +684,7 @@ st.markdown(f"## {choice}")
 st.markdown("---")
 
 # 카드 목록
-cards = get_cards(current_page_id)
+cards = load_cards(page_versions, current_page_id)
 if not cards:
     add_card(current_page_id)
     cards = get_cards(current_page_id)
@@ -382,7 +692,7 @@ if not cards:
 # 카드 툴바 (저장 / 추가 / 삭제)
 st.radio(
     "",
-    ["-", "💾 저장", "＋ 카드 추가", "🗑 카드 삭제"],
+    ["-", "💾 저장", "＋ 카드 추가", "🗑 카드 삭제", "🧹 중복 정리"],
     key="card_toolbar",
     horizontal=True,
     label_visibility="collapsed",
@@ -393,25 +703,80 @@ card_action = st.session_state.get("card_toolbar", "-")
 # 카드 렌더링 (Expander: 제목 = 헤더, 내부에 제목/내용)
 #  - 항상 닫힌 상태(expanded=False)에서 시작
 # ============================================================
+# 관련 카드 (TF-IDF 유사도 상위 3개)
+related = {card_id: related_index.related(card_id, k=3) for card_id, _, _ in cards}
+related_titles = get_card_titles(
+    {other_id for hits in related.values() for other_id, _ in hits}
+)
+
+# 세션이 시작될 때 한 번만 초안을 불러와 편집기에 채운다
+if "draft_values" not in st.session_state:
+    st.session_state["draft_values"] = draft_journal.pending(USER_ID)
+draft_values = st.session_state["draft_values"]
+
 for card_id, title, content in cards:
+    draft = draft_values.get(card_id, {})
     header = title if title else "제목 없음"
     with st.expander(header, expanded=False):  # 기본 닫힌 상태
+        if draft:
+            st.caption("📝 저장되지 않은 변경 내용이 있습니다.")
         st.text_input(
             "",
-            value=title,
+            value=draft.get("title", title),
             key=f"title_{card_id}",
             label_visibility="collapsed",
             placeholder="제목 입력",
+            on_change=journal_edit,
+            args=(card_id, "title"),
         )
 
-        st.text_area(
-            "",
-            value=content,
-            height=110,
-            key=f"content_{card_id}",
-            label_visibility="collapsed",
-            placeholder="내용을 입력하세요",
-        )
+        if st.toggle("읽기 모드", key=f"read_{card_id}"):
+            st.markdown(
+                preview_cache.render(draft.get("content", content)),
+                unsafe_allow_html=True,
+            )
+        else:
+            st.text_area(
+                "",
+                value=draft.get("content", content),
+                height=110,
+                key=f"content_{card_id}",
+                label_visibility="collapsed",
+                placeholder="내용을 입력하세요",
+                on_change=journal_edit,
+                args=(card_id, "content"),
+            )
+
+        history = revisions.list_revisions(db, card_id)
+        if len(history) > 1:
+            with st.popover("🕘 기록"):
+                labels = {
+                    rev: f"#{rev} · "
+                    f"{time.strftime('%m-%d %H:%M', time.localtime(saved_at))} · "
+                    f"{rev_title or '제목 없음'}"
+                    for rev, rev_title, saved_at in history
+                }
+                rev = st.selectbox(
+                    "리비전", list(labels), format_func=labels.get, key=f"rev_{card_id}"
+                )
+                version = revisions.reconstruct(db, card_id, rev)
+                if version is None:
+                    st.caption("없는 리비전입니다 (이미 정리되었습니다).")
+                else:
+                    st.text(version[1][:1000])
+                    if st.button("이 버전으로 복원", key=f"restore_{card_id}"):
+                        if restore_revision(card_id, rev):
+                            st.rerun()
+                        st.warning("없는 리비전입니다 (이미 정리되었습니다).")
+
+        hits = [h for h in related[card_id] if h[0] in related_titles]
+        if hits:
+            st.caption("관련 카드")
+            for other_id, score in hits:
+                other_title, other_page = related_titles[other_id]
+                st.caption(
+                    f"· {other_title or '제목 없음'} — {other_page} ({score:.0%})"
+                )
 
 # ============================================================
 # 카드 툴바 동작 처리
@@ -419,9 +784,17 @@ for card_id, title, content in cards:
 # 1) 전체 저장 (한 번만 실행)
 if card_action == "💾 저장" and st.session_state["card_toolbar_last"] != "💾 저장":
     for card_id, title, content in cards:
-        new_title = st.session_state.get(f"title_{card_id}", title)
-        new_content = st.session_state.get(f"content_{card_id}", content)
+        draft = draft_values.get(card_id, {})
+        new_title = st.session_state.get(
+            f"title_{card_id}", draft.get("title", title)
+        )
+        new_content = st.session_state.get(
+            f"content_{card_id}", draft.get("content", content)
+        )
         update_card(card_id, new_title, new_content)
+    draft_journal.discard(USER_ID, [card[0] for card in cards])
+    for card in cards:
+        draft_values.pop(card[0], None)
 
     st.session_state["card_toolbar_last"] = "💾 저장"
     st.success("모든 카드가 저장되었습니다.")
@@ -458,3 +831,44 @@ if card_action == "🗑 카드 삭제":
         else:
             st.warning("삭제할 카드 제목을 입력해주세요.")
         st.rerun()
+
+# 4) 중복 카드 정리 (MinHash/LSH)
+if card_action == "🧹 중복 정리":
+    st.info(
+        "내용이 거의 같은 카드 묶음을 찾습니다. "
+        "병합하면 가장 긴 카드와 닮은 카드만 지웁니다."
+    )
+    c1, c2 = st.columns(2)
+    with c1:
+        scan = st.button("중복 검사", key="dedup_scan")
+    with c2:
+        rebuild = st.button("인덱스 다시 만들기", key="dedup_rebuild")
+    if rebuild or (scan and not dedup.is_built(db)):
+        if not rebuild:
+            st.caption("기존 카드가 아직 인덱싱되지 않아 먼저 인덱스를 만듭니다.")
+        bar = st.progress(0.0)
+        dedup.rebuild(
+            db, progress=lambda done, total: bar.progress(done / max(total, 1))
+        )
+    if scan or rebuild:
+        st.session_state["dedup_report"] = dedup.find_clusters(db)
+
+    report = st.session_state.get("dedup_report")
+    if report is not None:
+        if not report:
+            st.success("중복 카드가 없습니다.")
+        titles = get_card_titles({cid for _, members in report for cid, _ in members})
+        for rep_id, members in report[:50]:
+            lines = [
+                f"- {titles[cid][0] or '제목 없음'} — {titles[cid][1]} ({score:.0%})"
+                for cid, score in members
+                if cid in titles
+            ]
+            st.markdown(f"**묶음 {len(lines)}장**\n" + "\n".join(lines))
+            if st.button("병합", key=f"dedup_merge_{rep_id}"):
+                keep_id, drop_ids = merge_duplicate_cards([cid for cid, _ in members])
+                st.session_state["dedup_report"] = [
+                    c for c in report if c[0] != rep_id
+                ]
+                st.success(f"{len(drop_ids)}장의 중복 카드를 삭제했습니다.")
+                st.rerun()
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+import time
+
+TASKS = ("optimize", "incremental_vacuum", "wal_checkpoint", "quick_check")
+# 한 번에 검사를 못 끝낸 테이블은 다음 차례에 시간을 두 배로 주되 이 값까지만
+MAX_CHECK_SECONDS = 30
+
+
+class MaintenanceScheduler(threading.Thread):
+    """유휴 시간에 DB 관리 작업을 돌리는 백그라운드 스레드 (프로세스당 하나).
+
+    앱은 실행될 때마다 touch(path)로 사용 중임을 알린다. 어떤 DB가
+    idle_seconds 동안 조용하고 마지막 관리 후 interval이 지났으면
+    PRAGMA optimize → incremental vacuum → WAL checkpoint → quick_check 를
+    작업마다 slice_seconds 이내로 나눠서 실행한다. 도중에 다시 touch 되면
+    남은 작업은 다음 유휴 시간으로 미룬다.
+    """
+
+    def __init__(
+        self,
+        idle_seconds: float = 60,
+        interval: float = 6 * 3600,
+        slice_seconds: float = 0.5,
+        forget_after: float = 24 * 3600,
+    ):
+        super().__init__(name="memoking-maintenance", daemon=True)
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self.slice_seconds = slice_seconds
+        self.forget_after = forget_after
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._activity = {}
+        self._status = {}
+        self._requested = set()
+        self._checks = {}
+
+    # ------------------------------------------------------------
+    # 앱에서 부르는 함수
+    # ------------------------------------------------------------
+    def touch(self, path: str):
+        with self._lock:
+            self._activity[path] = time.time()
+            self._status.setdefault(path, self._new_status())
+
+    def request_run(self, path: str):
+        """관리 화면의 '지금 실행': 유휴 여부와 상관없이 다음 차례에 실행."""
+        with self._lock:
+            self._requested.add(path)
+        self._wake.set()
+
+    def status(self, path: str):
+        with self._lock:
+            status = self._status.get(path) or self._new_status()
+            return {**status, "last_run": dict(status["last_run"])}
+
+    @staticmethod
+    def _new_status():
+        return {
+            "state": "대기",
+            "last_run": {},
+            "reclaimed_bytes": 0,
+            "freelist_bytes": 0,
+            "quick_check": None,
+            "last_error": None,
+            "pending": False,
+            "last_cycle": 0.0,
+        }
+
+    # ------------------------------------------------------------
+    # 스레드
+    # ------------------------------------------------------------
+    def run(self):
+        while True:
+            self._wake.wait(timeout=5)
+            self._wake.clear()
+            for path in self._due_paths():
+                self._run_cycle(path)
+
+    def _due_paths(self):
+        now = time.time()
+        due = []
+        with self._lock:
+            for path, last in list(self._activity.items()):
+                status = self._status[path]
+                if now - last > self.forget_after and path not in self._requested:
+                    del self._activity[path]
+                    del self._status[path]
+                    self._checks.pop(path, None)
+                    continue
+                if path in self._requested:
+                    due.append(path)
+                elif now - last >= self.idle_seconds and (
+                    status["pending"] or now - status["last_cycle"] >= self.interval
+                ):
+                    due.append(path)
+            self._requested.difference_update(due)
+        return due
+
+    def _interrupted(self, path, started):
+        with self._lock:
+            return self._activity.get(path, 0) > started
+
+    def _run_cycle(self, path):
+        started = time.time()
+        self._update(path, state="실행 중", last_error=None)
+        try:
+            conn = sqlite3.connect(path, timeout=1)
+        except sqlite3.Error as exc:
+            self._update(path, state="대기", last_error=str(exc))
+            return
+        pending = False
+        try:
+            for task in TASKS:
+                if self._interrupted(path, started):
+                    pending = True
+                    break
+                try:
+                    done = getattr(self, "_" + task)(conn, path)
+                except sqlite3.Error as exc:
+                    self._update(path, last_error=f"{task}: {exc}")
+                    continue
+                with self._lock:
+                    self._status[path]["last_run"][task] = time.time()
+                pending = pending or done is False
+        finally:
+            conn.close()
+        self._update(path, state="대기", pending=pending, last_cycle=time.time())
+
+    def _update(self, path, **values):
+        with self._lock:
+            self._status.setdefault(path, self._new_status()).update(values)
+
+    # ------------------------------------------------------------
+    # 작업 (False를 돌려주면 시간이 모자라 다음 유휴 때 바로 이어서 한다)
+    # ------------------------------------------------------------
+    def _optimize(self, conn, path):
+        # analysis_limit로 큰 테이블도 표본만 읽어 ANALYZE 시간을 제한한다
+        conn.execute("PRAGMA analysis_limit=400")
+        conn.execute("PRAGMA optimize")
+
+    def _incremental_vacuum(self, conn, path):
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            self._update(path, freelist_bytes=free * page_size)
+            return None
+        deadline = time.time() + self.slice_seconds
+        reclaimed = 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free and time.time() < deadline:
+            conn.execute("PRAGMA incremental_vacuum(64)").fetchall()
+            conn.commit()
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            reclaimed += (free - after) * page_size
+            free = after
+        with self._lock:
+            status = self._status[path]
+            status["reclaimed_bytes"] += reclaimed
+            status["freelist_bytes"] = free * page_size
+        return free == 0
+
+    def _wal_checkpoint(self, conn, path):
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+
+    def _quick_check(self, conn, path):
+        # 테이블마다 quick_check(<table>)를 돌려 여러 유휴 시간에 나눠서 한 바퀴 돈다
+        check = self._checks.get(path)
+        if check is None:
+            tables = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+                )
+            ]
+            check = self._checks[path] = {
+                "tables": tables,
+                "total": len(tables),
+                "problems": [],
+                "budget": self.slice_seconds,
+            }
+        deadline = time.time() + self.slice_seconds
+        while check["tables"] and time.time() < deadline:
+            table = check["tables"][0]
+            table_deadline = time.time() + check["budget"]
+            conn.set_progress_handler(lambda: time.time() > table_deadline, 10000)
+            try:
+                rows = conn.execute(
+                    'PRAGMA quick_check("%s")' % table.replace('"', '""')
+                ).fetchall()
+            except sqlite3.OperationalError as exc:
+                if "no such table" in str(exc):
+                    check["tables"].pop(0)
+                    continue
+                if "interrupted" not in str(exc):
+                    raise
+                check["budget"] = min(check["budget"] * 2, MAX_CHECK_SECONDS)
+                break
+            finally:
+                conn.set_progress_handler(None, 0)
+            check["tables"].pop(0)
+            check["budget"] = self.slice_seconds
+            check["problems"].extend(row[0] for row in rows if row[0] != "ok")
+        if check["tables"]:
+            done = check["total"] - len(check["tables"])
+            self._update(path, quick_check=f"검사 중 ({done}/{check['total']} 테이블)")
+            return False
+        del self._checks[path]
+        self._update(path, quick_check=", ".join(check["problems"]) or "ok")
+
+
+def enable_incremental_vacuum(path: str):
+    """기존 DB를 auto_vacuum=INCREMENTAL로 전환 (전체 VACUUM, 한 번만 필요)."""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
@@ -0,0 +1,93 @@
+import hashlib
+import html
+import re
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+import markdown
+from markdown.treeprocessors import Treeprocessor
+
+# 주소 안의 공백/제어 문자는 브라우저가 무시하므로 scheme을 보기 전에 지운다
+_IGNORED_CHARS_RE = re.compile(r"[\x00-\x20\x7f]")
+_SAFE_SCHEMES = {"", "http", "https", "mailto"}
+
+
+def _is_safe_url(url: str) -> bool:
+    """scheme이 없는 상대 주소나 http/https/mailto만 허용 (&#58; 같은 문자 참조도 풀어서 본다)."""
+    url = _IGNORED_CHARS_RE.sub("", html.unescape(url))
+    try:
+        scheme = urllib.parse.urlsplit(url).scheme
+    except ValueError:
+        return False
+    return scheme.lower() in _SAFE_SCHEMES
+
+
+class _StripUnsafeLinks(Treeprocessor):
+    """javascript: 같은 링크/이미지 주소를 지운다."""
+
+    def run(self, root):
+        for el in root.iter():
+            for attr in ("href", "src"):
+                url = el.get(attr)
+                if url is not None and not _is_safe_url(url):
+                    del el.attrib[attr]
+
+
+def render_markdown(content: str) -> str:
+    """카드 내용을 HTML로 변환. 카드에 적힌 raw HTML은 그대로 글자로 보여준다."""
+    md = markdown.Markdown(extensions=["fenced_code", "tables", "sane_lists", "nl2br"])
+    md.preprocessors.deregister("html_block")
+    md.inlinePatterns.deregister("html")
+    md.treeprocessors.register(_StripUnsafeLinks(md), "strip_unsafe_links", 0)
+    return md.convert(content or "")
+
+
+class PreviewCache:
+    """내용 해시 → 렌더링된 HTML. 세션 사이에 공유되는 LRU.
+
+    개수(max_entries)와 전체 크기(max_bytes) 둘 다 넘지 않게 오래된 것부터 버린다.
+    """
+
+    def __init__(self, max_entries: int = 2000, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, content: str) -> str:
+        key = hashlib.sha1((content or "").encode("utf-8")).digest()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+        # 렌더링은 잠금 밖에서 (느린 카드 하나가 다른 세션을 막지 않도록)
+        html = render_markdown(content)
+        size = len(html.encode("utf-8"))
+        with self._lock:
+            if key not in self._items and size <= self.max_bytes:
+                self._items[key] = (html, size)
+                self._bytes += size
+                while (
+                    len(self._items) > self.max_entries or self._bytes > self.max_bytes
+                ):
+                    _, (_, old_size) = self._items.popitem(last=False)
+                    self._bytes -= old_size
+        return html
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
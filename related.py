@@ -0,0 +1,400 @@
+import os
+import re
+import tempfile
+import threading
+import zipfile
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+# 해시 트릭을 쓰므로 어휘 사전 없이 열 번호가 고정된다 (증분 갱신/저장이 단순해짐)
+N_FEATURES = 1 << 20
+TITLE_WEIGHT = 2
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[가-힣]+")
+
+
+def tokenize(text: str):
+    """영문/숫자는 단어 단위, 한글은 음절 bigram 단위로 자른다.
+
+    한국어는 조사/어미가 붙어 단어 단위 일치가 잘 안 되므로
+    '회의록을' / '회의록' 처럼 어절이 달라도 bigram이 겹치도록 한다.
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if "가" <= run[0] <= "힣":
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        elif len(run) > 1:
+            tokens.append(run)
+    return tokens
+
+
+def card_terms(title: str, content: str):
+    """카드 하나를 (열 번호 배열, 빈도 배열)로 변환. 제목은 가중치를 더 준다."""
+    counts = {}
+    for weight, text in ((TITLE_WEIGHT, title or ""), (1, content or "")):
+        for tok in tokenize(text):
+            col = zlib.crc32(tok.encode("utf-8")) % N_FEATURES
+            counts[col] = counts.get(col, 0) + weight
+    cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    vals = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    order = np.argsort(cols)
+    return cols[order], vals[order]
+
+
+def card_checksum(title: str, content: str) -> int:
+    return zlib.crc32(f"{title or ''}\x00{content or ''}".encode("utf-8"))
+
+
+def _weigh(tf, idf):
+    w = tf.copy()
+    np.log1p(w.data, out=w.data)
+    w = w.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(w.multiply(w).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(w).astype(np.float32)
+
+
+def _delta_csr(delta):
+    """{card_id: (cols, vals)} → (ids 배열, tf 행렬)."""
+    ids = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+    indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+    cols, vals = [], []
+    for i, (c, v) in enumerate(delta.values()):
+        cols.append(c)
+        vals.append(v)
+        indptr[i + 1] = indptr[i] + len(c)
+    tf = sparse.csr_matrix(
+        (
+            np.concatenate(vals) if vals else np.zeros(0, np.float32),
+            np.concatenate(cols) if cols else np.zeros(0, np.int32),
+            indptr,
+        ),
+        shape=(len(ids), N_FEATURES),
+    )
+    return ids, tf
+
+
+def _build(ids, tf):
+    """(ids, tf 행렬)로 base 상태를 계산. self를 건드리지 않으므로 잠금 밖에서 돌린다."""
+    tf = tf.astype(np.float32)
+    tf.sort_indices()
+    ids = ids.astype(np.int64)
+    df = np.bincount(tf.indices, minlength=N_FEATURES).astype(np.int32)
+    n = max(len(ids), 1)
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    return {
+        "ids": ids,
+        "pos": {card_id: i for i, card_id in enumerate(ids.tolist())},
+        "tf": tf,
+        "dead": np.zeros(len(ids), dtype=bool),
+        "df": df,
+        "idf": idf,
+        "weighted": _weigh(tf, idf).tocsc(),
+    }
+
+
+class RelatedIndex:
+    """카드 제목/내용 TF-IDF 인덱스.
+
+    - base: 마지막 압축(compaction) 시점의 희소 행렬 (열 단위 조회를 위해 CSC로 보관)
+    - delta: 그 이후 추가/수정된 카드 (작은 dict, 질의 때 따로 계산)
+    delta가 일정 크기를 넘으면 백그라운드 스레드가 base에 합쳐서 다시 만들고
+    디스크에 저장한다. 무거운 계산과 파일 쓰기는 _lock 밖에서 하므로 그동안에도
+    related() 질의와 갱신은 막히지 않는다.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._pos = {}
+        self._tf = sparse.csr_matrix((0, N_FEATURES), dtype=np.float32)
+        self._weighted = sparse.csc_matrix((0, N_FEATURES), dtype=np.float32)
+        self._dead = np.zeros(0, dtype=bool)
+        self._idf = np.ones(N_FEATURES, dtype=np.float32)
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._checksums = {}
+        # card_id → page_id (sync_pages()에서 지워진 카드를 찾는 데 쓴다)
+        self._page_of = {}
+        self._synced_versions = None
+        self._delta = {}
+        self._delta_matrix = None
+        # 압축 중에 바뀐 card_id (압축 중이 아니면 None)
+        self._changed = None
+        self._compacting = False
+        self._compact_lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # 저장 / 불러오기 / DB와 동기화
+    # ------------------------------------------------------------
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as f:
+                tf = sparse.csr_matrix(
+                    (f["data"], f["indices"], f["indptr"]),
+                    shape=(len(f["ids"]), N_FEATURES),
+                )
+                ids = f["ids"]
+                checksums = f["checksums"]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # 깨진 인덱스 파일은 버리고 sync()에서 새로 만든다
+            return False
+        with self._lock:
+            self._checksums = dict(zip(ids.tolist(), checksums.tolist()))
+            self._install(_build(ids, tf))
+        return True
+
+    def save(self):
+        """delta와 지운 행을 base에 합치고 디스크에 저장."""
+        with self._compact_lock:
+            # base 행렬은 제자리에서 바뀌지 않으므로 참조만 잡고, 바뀌는 것만 복사
+            with self._lock:
+                ids, tf, dead = self._ids, self._tf, self._dead.copy()
+                delta = dict(self._delta)
+                checksums = dict(self._checksums)
+                self._changed = set()
+
+            try:
+                alive = ~dead
+                blocks_ids, blocks = [ids[alive]], [tf[alive]]
+                if delta:
+                    delta_ids, delta_tf = _delta_csr(delta)
+                    blocks_ids.append(delta_ids)
+                    blocks.append(delta_tf)
+                state = _build(
+                    np.concatenate(blocks_ids), sparse.vstack(blocks, format="csr")
+                )
+            except BaseException:
+                # 바꿔 넣지 못했으므로 바뀐 카드 기록을 멈춘다 (계속 쌓이지 않게)
+                with self._lock:
+                    self._changed = None
+                raise
+
+            with self._lock:
+                changed, self._changed = self._changed, None
+                live_delta = self._delta
+                self._install(state)
+                # 계산하는 동안 바뀐 카드는 새 base에서 지우고 최신 내용을 delta로 둔다
+                for card_id in changed:
+                    self._drop_locked(card_id)
+                    checksums.pop(card_id, None)
+                    if card_id in live_delta:
+                        cols, vals = live_delta[card_id]
+                        self._delta[card_id] = (cols, vals)
+                        self._df[cols] += 1
+
+            # 체크섬이 없는 행은 0으로 저장 → 다음 sync()에서 다시 토큰화된다
+            # 같은 노트북을 여는 다른 프로세스/인스턴스와 임시 파일이 겹치지 않게
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(self.path) or ".", suffix=".npz"
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(
+                        f,
+                        ids=state["ids"],
+                        checksums=np.array(
+                            [checksums.get(i, 0) for i in state["ids"].tolist()],
+                            dtype=np.uint32,
+                        ),
+                        data=state["tf"].data,
+                        indices=state["tf"].indices,
+                        indptr=state["tf"].indptr,
+                    )
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def sync(self, conn, batch_size: int = 5000):
+        """DB의 cards 테이블과 맞춘다. 체크섬이 다른 카드만 다시 토큰화한다."""
+        cur = conn.cursor()
+        cur.execute("SELECT id, page_id, title, content FROM cards")
+        seen = set()
+        changed = 0
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for card_id, page_id, title, content in rows:
+                seen.add(card_id)
+                self._page_of[card_id] = page_id
+                if self._checksums.get(card_id) != card_checksum(title, content):
+                    self.upsert(card_id, title, content, autosave=False)
+                    changed += 1
+        for card_id in set(self._checksums) - seen:
+            self.remove(card_id, autosave=False)
+            changed += 1
+        if changed or not os.path.exists(self.path):
+            self.save()
+        return changed
+
+    def sync_pages(self, conn, page_ids):
+        """page_ids에 속한 카드만 DB와 맞춘다 (다른 프로세스가 바꾼 카드 반영용)."""
+        page_ids = set(page_ids)
+        if not page_ids:
+            return 0
+        marks = ",".join("?" * len(page_ids))
+        rows = conn.execute(
+            f"SELECT id, page_id, title, content FROM cards WHERE page_id IN ({marks})",
+            list(page_ids),
+        ).fetchall()
+        seen = set()
+        changed = 0
+        for card_id, page_id, title, content in rows:
+            seen.add(card_id)
+            self._page_of[card_id] = page_id
+            if self._checksums.get(card_id) != card_checksum(title, content):
+                self.upsert(card_id, title, content)
+                changed += 1
+        gone = [
+            card_id
+            for card_id, page_id in list(self._page_of.items())
+            if page_id in page_ids and card_id not in seen
+        ]
+        for card_id in gone:
+            self.remove(card_id)
+            changed += 1
+        return changed
+
+    def sync_versions(self, conn, versions):
+        """live.ChangeWatcher.versions() 결과가 지난번과 다른 페이지만 sync_pages().
+
+        이 프로세스가 아닌 곳(다른 서버 프로세스, store_service)에서 바뀐 카드도
+        관련 카드에 반영된다. 처음 호출은 기준점만 기록한다 (불러올 때 sync()함).
+        """
+        with self._lock:
+            old = self._synced_versions
+            if versions is old:
+                return 0
+            self._synced_versions = versions
+        if old is None:
+            return 0
+        pages = {
+            page_id
+            for page_id in set(old) | set(versions)
+            if old.get(page_id) != versions.get(page_id)
+        }
+        return self.sync_pages(conn, pages)
+
+    # ------------------------------------------------------------
+    # 증분 갱신
+    # ------------------------------------------------------------
+    def upsert(
+        self, card_id: int, title: str, content: str, autosave=True, page_id=None
+    ):
+        cols, vals = card_terms(title, content)
+        with self._lock:
+            if page_id is not None:
+                self._page_of[card_id] = page_id
+            self._drop_locked(card_id)
+            self._delta[card_id] = (cols, vals)
+            self._df[cols] += 1
+            self._checksums[card_id] = card_checksum(title, content)
+            self._delta_matrix = None
+            if autosave:
+                self._maybe_compact()
+
+    def remove(self, card_id: int, autosave=True):
+        with self._lock:
+            self._drop_locked(card_id)
+            self._checksums.pop(card_id, None)
+            self._page_of.pop(card_id, None)
+            if autosave:
+                self._maybe_compact()
+
+    def _drop_locked(self, card_id):
+        if self._changed is not None:
+            self._changed.add(card_id)
+        if card_id in self._delta:
+            cols, _ = self._delta.pop(card_id)
+            self._df[cols] -= 1
+            self._delta_matrix = None
+        row = self._pos.get(card_id)
+        if row is not None and not self._dead[row]:
+            start, end = self._tf.indptr[row], self._tf.indptr[row + 1]
+            self._df[self._tf.indices[start:end]] -= 1
+            self._dead[row] = True
+
+    def _maybe_compact(self):
+        if self._compacting:
+            return
+        if len(self._delta) + int(self._dead.sum()) > max(1000, len(self._ids) // 20):
+            self._compacting = True
+            threading.Thread(
+                target=self._compact_in_background,
+                name="memoking-related-compact",
+                daemon=True,
+            ).start()
+
+    def _compact_in_background(self):
+        try:
+            self.save()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _install(self, state):
+        self._ids = state["ids"]
+        self._pos = state["pos"]
+        self._tf = state["tf"]
+        self._dead = state["dead"]
+        self._df = state["df"]
+        self._idf = state["idf"]
+        self._weighted = state["weighted"]
+        self._delta = {}
+        self._delta_matrix = None
+
+    # ------------------------------------------------------------
+    # 질의
+    # ------------------------------------------------------------
+    def related(self, card_id: int, k: int = 5, min_score: float = 0.05):
+        """card_id와 코사인 유사도가 높은 카드 [(id, score), ...] 상위 k개."""
+        with self._lock:
+            if card_id in self._delta:
+                cols, vals = self._delta[card_id]
+            elif card_id in self._pos and not self._dead[self._pos[card_id]]:
+                row = self._pos[card_id]
+                start, end = self._tf.indptr[row], self._tf.indptr[row + 1]
+                cols = self._tf.indices[start:end]
+                vals = self._tf.data[start:end]
+            else:
+                return []
+            if len(cols) == 0:
+                return []
+
+            q = np.log1p(vals) * self._idf[cols]
+            q /= np.linalg.norm(q) or 1
+
+            scores = self._weighted[:, cols] @ q
+            scores[self._dead] = -1
+            cand_ids = self._ids
+            if self._delta:
+                if self._delta_matrix is None:
+                    delta_ids, delta_tf = _delta_csr(self._delta)
+                    self._delta_matrix = (
+                        delta_ids,
+                        _weigh(delta_tf, self._idf).tocsc(),
+                    )
+                delta_ids, delta_w = self._delta_matrix
+                scores = np.concatenate([scores, delta_w[:, cols] @ q])
+                cand_ids = np.concatenate([cand_ids, delta_ids])
+
+            scores[cand_ids == card_id] = -1
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return [
+                (int(cand_ids[i]), float(scores[i]))
+                for i in top
+                if scores[i] >= min_score
+            ]
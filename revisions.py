@@ -0,0 +1,180 @@
+import difflib
+import json
+import time
+import zlib
+
+# 이 간격마다 전체 내용을 저장 → 복원 시 적용할 delta는 최대 SNAPSHOT_EVERY - 1개
+SNAPSHOT_EVERY = 20
+# 카드당 보관할 리비전 수 (넘치면 오래된 것부터 정리)
+KEEP_REVISIONS = 100
+
+
+def init_tables(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS card_revisions(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL,
+            rev INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            title TEXT,
+            body BLOB NOT NULL,
+            checksum INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_card_revisions "
+        "ON card_revisions(card_id, rev)"
+    )
+
+
+def make_delta(old: str, new: str):
+    """줄 단위 delta: 양수 n = 이전 n줄 유지, 음수 -n = n줄 건너뜀, 문자열 = 삽입."""
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(old: str, ops):
+    lines = old.splitlines(keepends=True)
+    pos = 0
+    out = []
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.extend(lines[pos : pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def _checksum(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _insert(cur, card_id, rev, kind, title, payload, checksum):
+    cur.execute(
+        "INSERT INTO card_revisions"
+        "(card_id, rev, kind, title, body, checksum, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            card_id,
+            rev,
+            kind,
+            title,
+            zlib.compress(payload.encode("utf-8")),
+            checksum,
+            time.time(),
+        ),
+    )
+
+
+def record(conn, card_id: int, old_title, old_content, title: str, content: str):
+    """update_card 직전에 호출 (commit은 호출한 쪽에서).
+
+    새 내용을 이전 내용에 대한 delta로 저장한다. 기록이 없거나 마지막 기록이
+    현재 DB 내용과 다르면 (다른 경로로 바뀐 경우) 이전 내용을 먼저 전체 저장한다.
+    """
+    old_title, old_content = old_title or "", old_content or ""
+    cur = conn.cursor()
+    last = cur.execute(
+        "SELECT rev, checksum FROM card_revisions WHERE card_id=? "
+        "ORDER BY rev DESC LIMIT 1",
+        (card_id,),
+    ).fetchone()
+    rev = last[0] if last else 0
+    old_checksum = _checksum(old_content)
+    if last is None or last[1] != old_checksum:
+        rev += 1
+        _insert(cur, card_id, rev, "full", old_title, old_content, old_checksum)
+
+    rev += 1
+    delta = json.dumps(make_delta(old_content, content), ensure_ascii=False)
+    if rev % SNAPSHOT_EVERY == 1 or len(delta) >= len(content):
+        _insert(cur, card_id, rev, "full", title, content, _checksum(content))
+    else:
+        _insert(cur, card_id, rev, "delta", title, delta, _checksum(content))
+
+    if rev % SNAPSHOT_EVERY == 0:
+        compact(conn, card_id)
+
+
+def list_revisions(conn, card_id: int, limit: int = KEEP_REVISIONS):
+    """[(rev, 제목, 저장 시각)] 최신순. 기본은 보관 중인 리비전 전부."""
+    return conn.execute(
+        "SELECT rev, title, created_at FROM card_revisions WHERE card_id=? "
+        "ORDER BY rev DESC LIMIT ?",
+        (card_id, limit),
+    ).fetchall()
+
+
+def reconstruct(conn, card_id: int, rev: int):
+    """rev 시점의 (제목, 내용). 가장 가까운 전체 저장본에서 delta를 순서대로 적용."""
+    rows = conn.execute(
+        """
+        SELECT kind, title, body FROM card_revisions
+        WHERE card_id=? AND rev<=? AND rev>=(
+            SELECT max(rev) FROM card_revisions
+            WHERE card_id=? AND rev<=? AND kind='full'
+        )
+        ORDER BY rev ASC
+        """,
+        (card_id, rev, card_id, rev),
+    ).fetchall()
+    if not rows:
+        return None
+    content = ""
+    title = None
+    for kind, title, body in rows:
+        payload = zlib.decompress(body).decode("utf-8")
+        if kind == "full":
+            content = payload
+        else:
+            content = apply_delta(content, json.loads(payload))
+    return title, content
+
+
+def compact(conn, card_id: int, keep: int = KEEP_REVISIONS):
+    """최근 keep개만 남긴다. 남는 것 중 가장 오래된 리비전은 전체 저장본으로 바꾼다."""
+    revs = [
+        row[0]
+        for row in conn.execute(
+            "SELECT rev FROM card_revisions WHERE card_id=? ORDER BY rev DESC",
+            (card_id,),
+        ).fetchall()
+    ]
+    if len(revs) <= keep:
+        return 0
+    oldest = revs[keep - 1]
+    title, content = reconstruct(conn, card_id, oldest)
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE card_revisions SET kind='full', body=? WHERE card_id=? AND rev=?",
+        (zlib.compress(content.encode("utf-8")), card_id, oldest),
+    )
+    cur.execute(
+        "DELETE FROM card_revisions WHERE card_id=? AND rev<?", (card_id, oldest)
+    )
+    return len(revs) - keep
+
+
+def remove_cards(conn, card_ids):
+    conn.executemany(
+        "DELETE FROM card_revisions WHERE card_id=?",
+        [(card_id,) for card_id in card_ids],
+    )
@@ -0,0 +1,60 @@
+import os
+import re
+import sqlite3
+
+DEFAULT_PATH = "memo.db"
+DEFAULT_NOTEBOOK = "기본"
+
+_UNSAFE_RE = re.compile(r"[^0-9A-Za-z가-힣_.-]")
+
+
+def load_config(secrets):
+    """저장소 설정. 환경변수가 secrets의 [storage] 섹션보다 우선한다.
+
+    [storage]
+    path = "memo.db"            # 기본 노트북 파일
+    shard_dir = "data/users"    # 설정하면 로그인 사용자마다 별도 DB 파일
+    max_connections = 16        # 인덱스/캐시를 메모리에 둘 노트북 수 (LRU)
+    socket = "/tmp/memoking.sock"  # store_service.py 를 띄운 경우 (단일 노트북 공유)
+
+    [storage.notebooks]
+    "업무" = "work.db"
+    """
+    conf = secrets.get("storage", {})
+    default_path = os.environ.get("MEMOKING_DB") or conf.get("path") or DEFAULT_PATH
+    notebooks = {DEFAULT_NOTEBOOK: default_path}
+    notebooks.update(conf.get("notebooks", {}))
+    return {
+        "notebooks": notebooks,
+        "shard_dir": os.environ.get("MEMOKING_SHARD_DIR") or conf.get("shard_dir"),
+        "socket": os.environ.get("MEMOKING_SOCKET") or conf.get("socket"),
+        "max_connections": int(
+            os.environ.get("MEMOKING_MAX_CONNECTIONS")
+            or conf.get("max_connections", 16)
+        ),
+    }
+
+
+def resolve_path(conf, notebook: str = DEFAULT_NOTEBOOK, user: str = None):
+    """노트북 이름(+ 샤딩 모드면 사용자)에 해당하는 DB 파일 경로."""
+    path = conf["notebooks"].get(notebook) or conf["notebooks"][DEFAULT_NOTEBOOK]
+    if conf["shard_dir"] and user:
+        safe_user = _UNSAFE_RE.sub("_", user).lstrip(".") or "_"
+        path = os.path.join(conf["shard_dir"], safe_user, os.path.basename(path))
+    return path
+
+
+def connect(path: str):
+    """WAL 연결. 세션마다 따로 열어도 읽기와 쓰기가 서로 막지 않는다."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    # 새 DB에만 적용된다 (테이블 생성·WAL 전환보다 먼저 와야 함).
+    # 기존 DB는 관리 화면에서 maintenance.enable_incremental_vacuum()으로 전환.
+    # 기존 DB에 실행하면 쓰기 잠금이 필요해 다른 쓰기와 부딪히므로 빈 파일일 때만
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,551 @@
+"""여러 Streamlit 프로세스가 하나의 노트북(DB)을 같이 쓰기 위한 로컬 저장소 서비스.
+
+쓰기 연결은 이 프로세스만 가진다. 들어온 쓰기 요청은 짧은 시간(batch_window)
+동안 모아서 한 트랜잭션으로 커밋(group commit)하고, 페이지/카드 목록 읽기는
+쓰기 때 무효화되는 캐시에서 돌려준다.
+
+    python store_service.py serve memo.db /tmp/memoking.sock
+    python store_service.py bench /tmp/bench.db
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import dedup
+import live
+import revisions
+import storage
+
+_HEADER = struct.Struct("!I")
+
+
+class StoreError(Exception):
+    """서비스가 요청을 처리하다 실패한 경우."""
+
+
+# ============================================================
+# 메시지: 4바이트 길이 + JSON
+# ============================================================
+def send_message(sock, obj):
+    data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def recv_message(sock):
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exact(sock, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+
+# ============================================================
+# 스키마 + 쓰기 작업 (memo.py / main20.py의 함수와 같은 동작)
+#  - 각 작업은 (결과, 무효화할 캐시 키 목록)을 돌려준다
+# ============================================================
+def init_schema(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pages(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cards(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page_id INTEGER,
+            title TEXT,
+            content TEXT,
+            FOREIGN KEY(page_id) REFERENCES pages(id)
+        )
+        """
+    )
+    dedup.init_tables(conn)
+    revisions.init_tables(conn)
+    live.init_tables(conn)
+    conn.commit()
+
+
+def op_add_page(conn, title="새 페이지"):
+    cur = conn.execute("INSERT INTO pages(title) VALUES(?)", (title,))
+    return cur.lastrowid, ["pages"]
+
+
+def op_delete_page(conn, page_id):
+    card_ids = [
+        row[0]
+        for row in conn.execute("SELECT id FROM cards WHERE page_id=?", (page_id,))
+    ]
+    conn.execute("DELETE FROM cards WHERE page_id=?", (page_id,))
+    conn.execute("DELETE FROM pages WHERE id=?", (page_id,))
+    dedup.remove_cards(conn, card_ids)
+    revisions.remove_cards(conn, card_ids)
+    return card_ids, ["pages", page_id]
+
+
+def op_rename_page(conn, page_id, new_title):
+    conn.execute("UPDATE pages SET title=? WHERE id=?", (new_title, page_id))
+    return None, ["pages"]
+
+
+def op_add_card(conn, page_id):
+    cur = conn.execute(
+        "INSERT INTO cards(page_id, title, content) VALUES (?, ?, ?)",
+        (page_id, "제목 없음", ""),
+    )
+    return cur.lastrowid, [page_id]
+
+
+def op_update_card(conn, card_id, title, content):
+    row = conn.execute(
+        "SELECT page_id, title, content FROM cards WHERE id=?", (card_id,)
+    ).fetchone()
+    if row is None or (row[1], row[2]) == (title, content):
+        return False, []
+    revisions.record(conn, card_id, row[1], row[2], title, content)
+    conn.execute(
+        "UPDATE cards SET title=?, content=? WHERE id=?",
+        (title, content, card_id),
+    )
+    dedup.index_card(conn, card_id, content)
+    return True, [row[0]]
+
+
+def op_delete_card_by_title(conn, page_id, title):
+    row = conn.execute(
+        "SELECT id FROM cards WHERE page_id=? AND title=? ORDER BY id ASC",
+        (page_id, title),
+    ).fetchone()
+    if not row:
+        return None, []
+    conn.execute("DELETE FROM cards WHERE id=?", (row[0],))
+    dedup.remove_cards(conn, [row[0]])
+    revisions.remove_cards(conn, [row[0]])
+    return row[0], [page_id]
+
+
+def op_merge_cluster(conn, card_ids):
+    keep_id, drop_ids = dedup.pick_keeper(conn, card_ids)
+    if drop_ids:
+        conn.executemany("DELETE FROM cards WHERE id=?", [(x,) for x in drop_ids])
+        dedup.remove_cards(conn, drop_ids)
+        revisions.remove_cards(conn, drop_ids)
+    # 어느 페이지 카드였는지 따로 찾지 않고 카드 캐시 전체를 비운다
+    return [keep_id, drop_ids], None
+
+
+WRITE_OPS = {
+    "add_page": op_add_page,
+    "delete_page": op_delete_page,
+    "rename_page": op_rename_page,
+    "add_card": op_add_card,
+    "update_card": op_update_card,
+    "delete_card_by_title": op_delete_card_by_title,
+    "merge_cluster": op_merge_cluster,
+}
+
+
+# ============================================================
+# 서비스
+# ============================================================
+class _Pending:
+    def __init__(self):
+        self._done = threading.Event()
+        self.ok = False
+        self.value = None
+
+    def resolve(self, ok, value):
+        self.ok, self.value = ok, value
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if not self.ok:
+            raise StoreError(self.value)
+        return self.value
+
+
+class StoreService:
+    def __init__(
+        self,
+        db_path: str,
+        batch_window: float = 0.0,
+        max_batch: int = 256,
+        cache_pages: int = 256,
+    ):
+        self.db_path = os.path.abspath(db_path)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache_pages = cache_pages
+        self._queue = queue.Queue()
+        self._reader = storage.connect(self.db_path)
+        init_schema(self._reader)
+        self._reader_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._generation = 0
+        self._data_version = None
+        self._versions = {}
+        self._pages = None
+        self._cards = OrderedDict()
+        self.stats = {
+            "writes": 0,
+            "batches": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="memoking-writer", daemon=True
+        )
+        self._writer.start()
+
+    def dispatch(self, op, args):
+        if op in WRITE_OPS:
+            pending = _Pending()
+            self._queue.put((op, args, pending))
+            return pending.wait()
+        if op == "get_pages":
+            return self._cached(
+                None, "SELECT id, title FROM pages ORDER BY id ASC", ()
+            )
+        if op == "get_cards":
+            return self._cached(
+                args[0],
+                "SELECT id, title, content FROM cards WHERE page_id=? ORDER BY id ASC",
+                (args[0],),
+            )
+        if op == "info":
+            with self._cache_lock:
+                return {"db_path": self.db_path, **self.stats}
+        raise StoreError(f"알 수 없는 요청: {op}")
+
+    # ------------------------------------------------------------
+    # 읽기 캐시 (쓰기 커밋 후 무효화, 세대 번호로 늦게 도착한 옛 결과는 버림)
+    #  - 서비스를 거치지 않은 쓰기도 잡도록 항목마다 page_versions 버전을 붙인다
+    # ------------------------------------------------------------
+    def _page_versions(self):
+        # data_version이 그대로면 어떤 연결도 커밋하지 않은 것 (live.ChangeWatcher와 같은 방식)
+        with self._reader_lock:
+            data_version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._versions = dict(
+                    self._reader.execute(
+                        "SELECT page_id, version FROM page_versions"
+                    ).fetchall()
+                )
+                self._data_version = data_version
+            return self._versions
+
+    def _cached(self, page_id, sql, params):
+        key = live.PAGE_LIST if page_id is None else page_id
+        version = self._page_versions().get(key, 0)
+        with self._cache_lock:
+            entry = self._pages if page_id is None else self._cards.get(page_id)
+            if entry is not None and entry[0] == version:
+                self.stats["cache_hits"] += 1
+                if page_id is not None:
+                    self._cards.move_to_end(page_id)
+                return entry[1]
+            self.stats["cache_misses"] += 1
+            generation = self._generation
+        with self._reader_lock:
+            rows = [list(row) for row in self._reader.execute(sql, params)]
+        with self._cache_lock:
+            if generation == self._generation:
+                if page_id is None:
+                    self._pages = (version, rows)
+                else:
+                    self._cards[page_id] = (version, rows)
+                    while len(self._cards) > self.cache_pages:
+                        self._cards.popitem(last=False)
+        return rows
+
+    def _invalidate(self, keys):
+        with self._cache_lock:
+            self._generation += 1
+            if keys is None:
+                self._pages = None
+                self._cards.clear()
+                return
+            for key in keys:
+                if key == "pages":
+                    self._pages = None
+                else:
+                    self._cards.pop(key, None)
+
+    # ------------------------------------------------------------
+    # 쓰기 (group commit)
+    # ------------------------------------------------------------
+    def _writer_loop(self):
+        conn = storage.connect(self.db_path)
+        conn.isolation_level = None
+        while True:
+            # 이전 커밋 동안 쌓인 요청을 한 번에 가져간다 (기다리지 않는 group commit).
+            # batch_window > 0 이면 그만큼 더 기다려 배치를 키운다.
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        batch.append(self._queue.get(timeout=timeout))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit_batch(conn, batch)
+
+    def _commit_batch(self, conn, batch):
+        results = []
+        touched = set()
+        invalidate_all = False
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, args, pending in batch:
+                # 요청 하나가 실패해도 같은 배치의 다른 요청은 커밋되도록 SAVEPOINT
+                conn.execute("SAVEPOINT op")
+                try:
+                    result, keys = WRITE_OPS[op](conn, *args)
+                except Exception as exc:  # 작업 하나의 오류로 쓰기 스레드가 죽지 않게
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((pending, False, f"{op}: {exc}"))
+                    continue
+                conn.execute("RELEASE op")
+                results.append((pending, True, result))
+                if keys is None:
+                    invalidate_all = True
+                else:
+                    touched.update(keys)
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(pending, False, str(exc)) for _, _, pending in batch]
+            touched, invalidate_all = set(), False
+        self._invalidate(None if invalidate_all else touched)
+        with self._cache_lock:
+            self.stats["batches"] += 1
+            self.stats["writes"] += len(batch)
+        for pending, ok, value in results:
+            pending.resolve(ok, value)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                msg = recv_message(self.request)
+            except (OSError, ValueError):
+                return
+            if msg is None:
+                return
+            try:
+                reply = {"ok": True, "result": service.dispatch(msg["op"], msg["args"])}
+            except (
+                StoreError,
+                sqlite3.Error,
+                KeyError,
+                IndexError,
+                TypeError,
+            ) as exc:
+                reply = {"ok": False, "error": str(exc)}
+            try:
+                send_message(self.request, reply)
+            except OSError:
+                return
+
+
+def serve(db_path: str, socket_path: str, ready=None):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, _Handler)
+    server.daemon_threads = True
+    server.service = StoreService(db_path)
+    if ready is not None:
+        ready.set()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+# ============================================================
+# 클라이언트 (소켓 풀)
+# ============================================================
+class StoreClient:
+    """StoreClient(path).call("update_card", card_id, title, content)
+
+    소켓을 요청마다 새로 열지 않고 pool_size개까지 재사용한다.
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 8, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def call(self, op, *args):
+        try:
+            sock, pooled = self._pool.get_nowait(), True
+        except queue.Empty:
+            sock, pooled = self._connect(), False
+        try:
+            try:
+                send_message(sock, {"op": op, "args": list(args)})
+            except OSError:
+                if not pooled:
+                    raise
+                # 서비스가 재시작돼 풀에 있던 소켓이 끊긴 경우: 보내기 전이므로 재시도
+                sock.close()
+                sock = self._connect()
+                send_message(sock, {"op": op, "args": list(args)})
+            reply = recv_message(sock)
+        except OSError:
+            sock.close()
+            raise
+        if reply is None:
+            sock.close()
+            raise ConnectionError("저장소 서비스 연결이 끊겼습니다.")
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+        if not reply["ok"]:
+            raise StoreError(reply["error"])
+        return reply["result"]
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# ============================================================
+# 벤치마크: SQLite 직접 접근 vs 서비스 (프로세스 여러 개가 동시에 카드 저장)
+# ============================================================
+def _bench_direct(db_path, card_ids, rounds, result):
+    conn = storage.connect(db_path)
+    conn.isolation_level = None
+    for i in range(rounds):
+        for card_id in card_ids:
+            conn.execute("BEGIN IMMEDIATE")
+            op_update_card(conn, card_id, "벤치", f"내용 {i} " * 20)
+            conn.execute("COMMIT")
+            conn.execute(
+                "SELECT id, title, content FROM cards WHERE page_id=1 ORDER BY id"
+            ).fetchall()
+    result.put(rounds * len(card_ids))
+
+
+def _bench_service(socket_path, card_ids, rounds, result):
+    client = StoreClient(socket_path)
+    for i in range(rounds):
+        for card_id in card_ids:
+            client.call("update_card", card_id, "벤치", f"내용 {i} " * 20)
+            client.call("get_cards", 1)
+    result.put(rounds * len(card_ids))
+
+
+def _run_workers(target, first_arg, processes, cards_per_process, rounds):
+    result = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=target,
+            args=(
+                first_arg,
+                list(range(1 + p * cards_per_process, 1 + (p + 1) * cards_per_process)),
+                rounds,
+                result,
+            ),
+        )
+        for p in range(processes)
+    ]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    done = sum(result.get() for _ in workers)
+    for w in workers:
+        w.join()
+    return done / (time.perf_counter() - started)
+
+
+def bench(db_path: str, processes: int = 8, cards_per_process: int = 20, rounds=10):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    conn = storage.connect(db_path)
+    init_schema(conn)
+    conn.execute("INSERT INTO pages(title) VALUES('벤치')")
+    conn.executemany(
+        "INSERT INTO cards(page_id, title, content) VALUES (1, '벤치', '')",
+        [()] * (processes * cards_per_process),
+    )
+    conn.commit()
+    conn.close()
+
+    direct = _run_workers(_bench_direct, db_path, processes, cards_per_process, rounds)
+    print(f"SQLite 직접: {direct:8.0f} 쓰기/초 ({processes} 프로세스)")
+
+    socket_path = db_path + ".sock"
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=serve, args=(db_path, socket_path, ready), daemon=True
+    )
+    server.start()
+    ready.wait()
+    service = _run_workers(
+        _bench_service, socket_path, processes, cards_per_process, rounds
+    )
+    info = StoreClient(socket_path).call("info")
+    server.terminate()
+    print(
+        f"저장소 서비스: {service:6.0f} 쓰기/초 (+ 같은 수의 읽기) "
+        f"배치당 평균 {info['writes'] / max(info['batches'], 1):.1f}건, "
+        f"읽기 캐시 적중 {info['cache_hits']}/"
+        f"{info['cache_hits'] + info['cache_misses']}"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "serve":
+        serve(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) >= 3 and sys.argv[1] == "bench":
+        bench(sys.argv[2])
+    else:
+        print(__doc__)